@@ -1,4 +1,5 @@
 import argparse
+import os
 from ultralytics import YOLO
 
 # ---------- Parse command-line arguments ----------
@@ -26,8 +27,34 @@ parser.add_argument(
     default="cpu", 
     help="Device for export (e.g. 'cpu', 'cuda:0', 'mps'). Use 'cuda' for --half."
 )
+parser.add_argument(
+    "--opset", 
+    type=int, 
+    default=17, 
+    help="ONNX opset version (default: 17)"
+)
+parser.add_argument(
+    "--dynamic", 
+    action="store_true", 
+    help="Export with dynamic input shapes (default: static, which optimizes better)"
+)
+parser.add_argument(
+    "--fp16-convert", 
+    action="store_true", 
+    help="Also write a .fp16.onnx copy with FP16 weights (GPU targets, no CUDA needed)"
+)
+parser.add_argument(
+    "--int8", 
+    action="store_true", 
+    help="Also write a .int8.onnx copy with dynamically quantized weights (CPU targets)"
+)
 args = parser.parse_args()
 
+# Post-export conversion expects FP32 weights: quantize_dynamic only quantizes
+# FP32 MatMul/Gemm weights, and an FP16 graph has nothing left to convert.
+if args.half and (args.fp16_convert or args.int8):
+    parser.error("--fp16-convert and --int8 require the FP32 export; drop --half")
+
 # ---------- Load model ----------
 model = YOLO(args.model)
 
@@ -35,11 +62,30 @@ model = YOLO(args.model)
 onnx_path = model.export(
     format="onnx",
     imgsz=args.imgsz,
-    dynamic=False,
+    dynamic=args.dynamic,
     half=args.half,
     simplify=True,
-    opset=14,
+    opset=args.opset,
     device=args.device
 )
 
 print("Exported:", onnx_path)
+
+# ---------- Optional post-export quantization ----------
+if args.fp16_convert:
+    import onnx
+    from onnxconverter_common import float16
+
+    # Keep inputs/outputs FP32 so the web runtime can feed the model unchanged
+    fp16_path = os.path.splitext(str(onnx_path))[0] + ".fp16.onnx"
+    fp16_model = float16.convert_float_to_float16(onnx.load(onnx_path), keep_io_types=True)
+    onnx.save(fp16_model, fp16_path)
+    print("Exported:", fp16_path)
+
+if args.int8:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # FP16 is often slower than FP32 on CPU; INT8 weights are the CPU-friendly option
+    int8_path = os.path.splitext(str(onnx_path))[0] + ".int8.onnx"
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    print("Exported:", int8_path)
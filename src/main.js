@@ -6,6 +6,7 @@ import "./style.css";
 import { WS_PORT, USE_BINARY } from "./config.js";
 import { setStatus } from "./ui.js";
 import { initSessions, IS_OBB } from "./inference/onnx.js";
+import { encodeTextMessage } from "./utils/protocol.js";
 import {
     handleBinaryMessage,
     setWebSocketSender as setBinarySender,
@@ -31,7 +32,7 @@ import {
             if (msg instanceof ArrayBuffer || ArrayBuffer.isView(msg)) {
                 ws.send(msg);
             } else {
-                ws.send(JSON.stringify(msg));
+                ws.send(encodeTextMessage(msg));
             }
         }
     };
@@ -41,10 +42,12 @@ import {
 
     ws.onopen = async () => {
         console.log("WebSocket connected");
-        ws.send(JSON.stringify({ loaded: true }));
+        ws.send(encodeTextMessage({ loaded: true }));
 
         const devices = await listWebcamDevices();
-        ws.send(JSON.stringify({ webcamDevices: devices.map((d) => d.label) }));
+        ws.send(
+            encodeTextMessage({ webcamDevices: devices.map((d) => d.label) }),
+        );
 
         let statusText = USE_BINARY ? "Ready (binary)" : "Ready (webcam)";
         if (IS_OBB) statusText += " [OBB]";
@@ -53,7 +56,7 @@ import {
         // Keep-Alive Heartbeat (every 30s)
         setInterval(() => {
             if (ws.readyState === WebSocket.OPEN) {
-                ws.send(JSON.stringify({ type: "keepalive" }));
+                ws.send(encodeTextMessage({ type: "keepalive" }));
             }
         }, 30000);
     };
@@ -77,14 +80,21 @@ import {
             // Handle sync/heartbeat messages (JSON) mixed with binary
             if (typeof data === "string") {
                 try {
-                    const msg = JSON.parse(data);
-                    if (msg.sync) {
-                        sender({
-                            tick: msg.tick,
-                            videoFrame: 0,
-                            frame: msg.frame,
-                            type: "sync",
-                        });
+                    const parsed = JSON.parse(data);
+                    // Forwarded JSON messages always arrive as {"batch": [...]}
+                    const msgs =
+                        parsed && Array.isArray(parsed.batch)
+                            ? parsed.batch
+                            : [parsed];
+                    for (const msg of msgs) {
+                        if (msg && msg.sync) {
+                            sender({
+                                tick: msg.tick,
+                                videoFrame: 0,
+                                frame: msg.frame,
+                                type: "sync",
+                            });
+                        }
                     }
                 } catch (e) {}
                 return;
@@ -71,3 +71,32 @@ export function formatPredictions(
         yolo_pose: predsPose,
     };
 }
+
+// 1-byte type tags prepended to outbound text messages. The TouchDesigner
+// WebSocket callbacks dispatch on the first character instead of scanning
+// the JSON payload (see td_scripts/webserver1_callbacks.py).
+export const MSG_TAG = {
+    predictions: "P",
+    sync: "S",
+    tick: "T",
+    keepalive: "K",
+    webcamDevices: "W",
+    loaded: "L",
+    status: "F",
+};
+
+function tagFor(msg) {
+    if (msg.type === "keepalive") return MSG_TAG.keepalive;
+    if (msg.type === "sync") return MSG_TAG.sync;
+    if (msg.type !== undefined) return MSG_TAG.predictions;
+    if (msg.webcamDevices !== undefined) return MSG_TAG.webcamDevices;
+    if (msg.tick !== undefined) return MSG_TAG.tick;
+    if (msg.loaded !== undefined) return MSG_TAG.loaded;
+    if (msg.lastFrameTime !== undefined) return MSG_TAG.status;
+    // Untagged messages are forwarded to the other connected clients
+    return "";
+}
+
+export function encodeTextMessage(msg) {
+    return tagFor(msg) + JSON.stringify(msg);
+}
@@ -4,6 +4,14 @@ import struct
 import json
 import time
 
+# Optional: Numba fuses the float32 -> uint8 quantization into a single pass.
+# Falls back to plain NumPy when it isn't installed in TouchDesigner's Python.
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
 HEADER_BYTES = 16
 TYPE_TENSOR  = 10
 DTYPE_U8     = 1
@@ -13,6 +21,86 @@ LAYOUT_CHW   = 1
 INPUT_H = 640
 INPUT_W = 640   # logical content width (not 3*W)
 
+# Seconds before a stuck 'busy' flag or in-flight frame is reset
+BUSY_TIMEOUT = 1.0
+
+# Persistent send buffer: 16-byte header followed by the planar CHW payload.
+# _payload is a view over _buf, so packing writes land directly in the bytes
+# handed to the WebSocket DAT and no per-frame payload copy is needed.
+# Only one frame may use it at a time: _in_flight is set when packing starts
+# and cleared once that frame has been sent or dropped (or after BUSY_TIMEOUT,
+# if its task never reports back). 'busy' can't guard it, since the browser
+# clears 'busy' on any text message.
+_HW = INPUT_H * INPUT_W
+_buf = bytearray(HEADER_BYTES + 3 * _HW)
+_payload = np.frombuffer(_buf, dtype=np.uint8, offset=HEADER_BYTES, count=3 * _HW)
+_full_mv = memoryview(_buf)
+# Shaped views of the payload, built once instead of reshaping every frame
+_PLANES = _payload.reshape(3, INPUT_H, INPUT_W)
+_MONO_ROWS = _payload.reshape(3 * INPUT_H, INPUT_W)
+
+# Scratch for the NumPy float32 quantization fallback (no per-frame temporaries).
+# With Numba the kernels write the planes directly, so it is never needed.
+if not _HAVE_NUMBA:
+    _f32_scratch = np.empty((INPUT_H, INPUT_W, 3), dtype=np.float32)
+
+# Header layout '<BBBBHHII': the first 4 bytes never change, so write them
+# once and only pack H, W, seq, frame per send.
+_buf[0:4] = bytes([TYPE_TENSOR, DTYPE_U8, LAYOUT_CHW, 0])
+_HDR_TAIL = struct.Struct('<HHII')
+
+if _HAVE_NUMBA:
+    # Kernels round exactly like the NumPy fallback (float32 multiply, then add,
+    # then clip and truncate), so output doesn't depend on Numba being present.
+    # fastmath is off because it would allow fusing the two steps into an FMA.
+    _F255 = np.float32(255.0)
+    _FHALF = np.float32(0.5)
+    _FZERO = np.float32(0.0)
+
+    @njit(parallel=True)
+    def _quantize_hwc_to_chw_f32(src, dst_planes):
+        """UNORM8 quantize + HWC -> CHW transpose of channels 0..2 in one pass."""
+        H, W = dst_planes.shape[1], dst_planes.shape[2]
+        for y in prange(H):
+            for x in range(W):
+                for c in range(3):
+                    v = src[y, x, c] * _F255 + _FHALF
+                    if v < _FZERO:
+                        v = _FZERO
+                    elif v > _F255:
+                        v = _F255
+                    dst_planes[c, y, x] = np.uint8(v)
+
+    @njit(parallel=True)
+    def _quantize_mono_f32(src, dst):
+        """UNORM8 quantize channel 0 of (rows, W, C) into a (rows, W) plane."""
+        rows, W = dst.shape
+        for y in prange(rows):
+            for x in range(W):
+                v = src[y, x, 0] * _F255 + _FHALF
+                if v < _FZERO:
+                    v = _FZERO
+                elif v > _F255:
+                    v = _F255
+                dst[y, x] = np.uint8(v)
+
+    @njit(boundscheck=False)
+    def _split_interleaved_u8(src, dst_planes):
+        """HWC -> CHW split of channels 0..2, one source row at a time so it stays in L1."""
+        H, W = dst_planes.shape[1], dst_planes.shape[2]
+        for y in range(H):
+            for c in range(3):
+                for x in range(W):
+                    dst_planes[c, y, x] = src[y, x, c]
+
+    # Compile at import so the first real frame doesn't pay the JIT cost
+    _quantize_hwc_to_chw_f32(np.zeros((1, 1, 3), dtype=np.float32),
+                             np.empty((3, 1, 1), dtype=np.uint8))
+    _quantize_mono_f32(np.zeros((1, 1, 1), dtype=np.float32),
+                       np.empty((1, 1), dtype=np.uint8))
+    _split_interleaved_u8(np.zeros((1, 1, 3), dtype=np.uint8),
+                          np.empty((3, 1, 1), dtype=np.uint8))
+
 # Helper to dynamically extract the TDTask class from the system Thread Manager
 def _get_td_task_class():
     try:
@@ -38,52 +126,75 @@ def _get_td_task_class():
         debug("Error finding TDTask class:", e)
     return None
 
+def _copy_channel0_u8(src, dst):
+    """
+    Writes channel 0 of a (rows, W, C) array into a uint8 (rows, W) plane,
+    UNORM8-quantizing float32 input.
+    """
+    if src.dtype == np.float32 and _HAVE_NUMBA:
+        _quantize_mono_f32(src, dst)
+        return
+
+    if src.dtype == np.uint8:
+        mono_u8 = src[..., 0]
+    elif src.dtype == np.float32:
+        mono_u8 = np.clip(src[..., 0] * 255.0 + 0.5, 0, 255).astype(np.uint8, copy=False)
+    else:
+        mono_u8 = np.clip(src[..., 0], 0, 255).astype(np.uint8, copy=False)
+    np.copyto(dst, mono_u8, casting='no')
+
 def _pack_from_vertical_planar_mono(arr_planar, H3, W):
     """
     Thread-safe path: input is shader-style vertically packed planar mono (3*H, W, C>=1).
     Since memory is row-major, this matches CHW natively!
     """
-    H = H3 // 3
-    if arr_planar.dtype == np.uint8:
-        # ZERO-COPY FAST PATH: If C=1 and it is C-contiguous, we can use the array directly
-        # without allocating a new payload array or copying data!
-        if arr_planar.ndim == 3 and arr_planar.shape[2] == 1:
-            mono_u8 = arr_planar[:, :, 0]
-            if mono_u8.flags['C_CONTIGUOUS']:
-                return mono_u8
-        mono_u8 = arr_planar[..., 0]
-    elif arr_planar.dtype == np.float32:
-        mono_u8 = (arr_planar[..., 0] * 255.0 + 0.5).astype(np.uint8, copy=False)
-    else:
-        mono_u8 = np.clip(arr_planar[..., 0], 0, 255).astype(np.uint8, copy=False)
-
-    payload = np.empty(3 * H * W, dtype=np.uint8)
-    planes = payload.reshape(3, H, W)
-    np.copyto(planes, mono_u8.reshape(3, H, W), casting='no')
+    # Rows are already plane-major, so a single copy into the send buffer suffices
+    payload = _MONO_ROWS[:H3]
+    _copy_channel0_u8(arr_planar, payload)
     return payload
 
 def _pack_from_interleaved_rgb(arr_rgb, H, W):
     """
     Thread-safe fallback: CPU version of compute shader doing interleaved to planar (CHW).
     """
+    # Only called with INPUT_H x INPUT_W frames, so the cached full-size views fit
+    payload = _payload
+    planes = _PLANES
+
     if arr_rgb.shape[2] < 3:
-        arr_rgb = np.repeat(arr_rgb, 3, axis=2)
-    else:
-        arr_rgb = arr_rgb[:, :, :3]
+        # Grayscale: fill one plane and duplicate it instead of np.repeat-ing to RGB
+        _copy_channel0_u8(arr_rgb, planes[0])
+        np.copyto(planes[1], planes[0])
+        np.copyto(planes[2], planes[0])
+        return payload
+
+    if _HAVE_NUMBA:
+        if arr_rgb.dtype == np.float32:
+            # Skips the intermediate uint8 image entirely
+            _quantize_hwc_to_chw_f32(arr_rgb, planes)
+            return payload
+        if arr_rgb.dtype == np.uint8:
+            _split_interleaved_u8(arr_rgb, planes)
+            return payload
+
+    arr_rgb = arr_rgb[:, :, :3]
 
     if arr_rgb.dtype == np.float32:
-        rgb_u8 = (arr_rgb * 255.0 + 0.5).astype(np.uint8, copy=False)
-    elif arr_rgb.dtype == np.uint8:
+        # Scale/round/clip in place, then cast straight into the CHW planes
+        np.multiply(arr_rgb, 255.0, out=_f32_scratch)
+        np.add(_f32_scratch, 0.5, out=_f32_scratch)
+        np.clip(_f32_scratch, 0, 255, out=_f32_scratch)
+        np.copyto(planes, np.transpose(_f32_scratch, (2, 0, 1)), casting='unsafe')
+        return payload
+
+    if arr_rgb.dtype == np.uint8:
         rgb_u8 = arr_rgb
     else:
         rgb_u8 = np.clip(arr_rgb, 0, 255).astype(np.uint8, copy=False)
 
-    # Super-fast 1D slice copy (bypasses expensive 3D strided transpose copies)
-    _HW = H * W
-    payload = np.empty(3 * _HW, dtype=np.uint8)
-    payload[:_HW] = rgb_u8[:, :, 0].ravel()
-    payload[_HW:2*_HW] = rgb_u8[:, :, 1].ravel()
-    payload[2*_HW:] = rgb_u8[:, :, 2].ravel()
+    # Single HWC -> CHW copy: one strided loop in NumPy's C core instead of
+    # three ravel() temporaries plus three copies back into the payload.
+    np.copyto(planes, np.transpose(rgb_u8, (2, 0, 1)), casting='no')
     return payload
 
 def _repack_task_fn(arr, H, W_or_W3, C, result_container):
@@ -93,7 +204,7 @@ def _repack_task_fn(arr, H, W_or_W3, C, result_container):
     """
     try:
         # ---------- PATH A: Shader-style vertical planar mono (3*H, W, C>=1) ----------
-        if (H % 3) == 0 and W_or_W3 == INPUT_W and C >= 1:
+        if (H % 3) == 0 and H <= 3 * INPUT_H and W_or_W3 == INPUT_W and C >= 1:
             payload = _pack_from_vertical_planar_mono(arr, H, W_or_W3)
             result_container['payload'] = payload
             result_container['h_final'] = H // 3
@@ -118,39 +229,72 @@ def _repack_task_fn(arr, H, W_or_W3, C, result_container):
         result_container['success'] = False
         result_container['error'] = str(e)
 
+# Whether webSocketSendBinary accepts a memoryview; probed on the first send
+_send_accepts_mv = None
+
 def _send_payload(client, webserver, payload, H, W, frame_num):
+    global _send_accepts_mv
+    # payload is a view over _buf, so only the header needs writing here
     seq = int(frame_num % (1 << 32))
-    buf = bytearray(HEADER_BYTES + payload.nbytes)
-    struct.pack_into('<BBBBHHII', buf, 0,
-                     TYPE_TENSOR, DTYPE_U8, LAYOUT_CHW, 0,
-                     H, W, seq, frame_num)
-    # Copy payload using memoryview for maximum efficiency (no extra copy)
-    buf[HEADER_BYTES:] = memoryview(payload)
-    webserver.webSocketSendBinary(client, buf)
+    _HDR_TAIL.pack_into(_buf, 4, H, W, seq, frame_num)
+    # Hand the DAT a zero-copy view; slicing the bytearray would copy the frame
+    frame_mv = _full_mv[:HEADER_BYTES + payload.nbytes]
+    if _send_accepts_mv:
+        webserver.webSocketSendBinary(client, frame_mv)
+    elif _send_accepts_mv is False:
+        # Builds that only accept bytes-like objects they can own
+        webserver.webSocketSendBinary(client, bytes(frame_mv))
+    else:
+        try:
+            webserver.webSocketSendBinary(client, frame_mv)
+            _send_accepts_mv = True
+        except TypeError:
+            # Only cache the fallback once bytes is known to work; any other
+            # TypeError propagates from this call and the probe is retried.
+            webserver.webSocketSendBinary(client, bytes(frame_mv))
+            _send_accepts_mv = False
 
 webserver = op('yolo_server/webserver1')
 client_op = op('yolo_server/active_client')
 top = op('source') 
+frame_op = op('frame')
+_td_task_class = None
+_warned_float_source = False
+_in_flight = False
+_in_flight_ts = 0.0
 def send_frame_u8_chw():
-    
-    # 1. Flow Control Check: If busy, skip frame to prevent network/pipeline flooding
-    if webserver.fetch('busy', False):
+    global _td_task_class, _warned_float_source, _in_flight, _in_flight_ts
+
+    # Read per-frame TD state once; every op/absTime access crosses into C++
+    frame_num = int(absTime.frame)
+    client = client_op.text.strip()
+
+    # 1. Flow Control Check: If busy, skip frame to prevent network/pipeline flooding.
+    # 'busy' holds the time.time() the frame was dispatched, or False when idle,
+    # so one store/fetch covers both the flag and its timeout.
+    busy_since = webserver.fetch('busy', False)
+    if busy_since:
         # Auto-reset busy timeout if stuck for > 1.0 second of real time
-        if time.time() - webserver.fetch('busy_ts', 0.0) >= 1.0:
+        if time.time() - busy_since >= BUSY_TIMEOUT:
             debug("Warning: Pipeline busy timeout. Resetting busy flag.")
             webserver.store('busy', False)
         else:
             # Send sync tick if client is active to keep the link alive
-            client = client_op.text.strip()
             if client:
-                msg = json.dumps({"sync": True, "tick": absTime.frame, "frame": absTime.frame})
+                msg = json.dumps({"sync": True, "tick": frame_num, "frame": frame_num})
                 webserver.webSocketSendText(client, msg)
             return
 
-    client = client_op.text.strip()
     if not client:
         return
-    
+
+    # The previous frame still owns the shared send buffer
+    if _in_flight:
+        # Auto-reset if its task never called back (e.g. the ThreadManager dropped it)
+        if time.time() - _in_flight_ts < BUSY_TIMEOUT:
+            return
+        debug("Warning: Frame in flight timeout. Resetting in-flight flag.")
+        _in_flight = False
     
     if top is None:
         return
@@ -160,18 +304,20 @@ def send_frame_u8_chw():
     if arr is None:
         return
 
+    # numpyArray() has no dtype argument; it returns uint8 only when the TOP is
+    # 8-bit fixed. Anything else costs a 4x larger copy plus a quantization pass.
+    if arr.dtype != np.uint8 and not _warned_float_source:
+        debug("Source TOP is {}: set its Pixel Format to 8-bit fixed (RGBA) "
+              "to skip float -> uint8 quantization.".format(arr.dtype))
+        _warned_float_source = True
+
     # Deep copy the array on the main thread to ensure absolute thread-safety.
     # This prevents the background thread from accessing active TouchDesigner-managed GPU/CPU-mapped memory,
     # which can lead to tearing, race conditions, or segmentation faults during frame drops.
     arr_copy = arr.copy()
 
-    # Mark busy immediately to lock the pipeline during packing/inference
     now = time.time()
-    webserver.store('busy', True)
-    webserver.store('busy_ts', now)
-
     H, W_or_W3, C = arr.shape
-    frame_num = int(absTime.frame)
 
     # Initialize a result container to collect data from the thread
     result_container = {
@@ -182,29 +328,38 @@ def send_frame_u8_chw():
         'error': None
     }
 
-    # Retrieve TDTask class dynamically
-    TDTask = _get_td_task_class()
+    # Retrieve TDTask class dynamically (resolved once, then cached)
+    if _td_task_class is None:
+        _td_task_class = _get_td_task_class()
+    TDTask = _td_task_class
     if TDTask is None:
         debug("ThreadManager TDTask class could not be resolved! Falling back to synchronous packing.")
         # Synchronous fallback if Thread Manager is missing
+        _in_flight = True
+        _in_flight_ts = now
         try:
             _repack_task_fn(arr_copy, H, W_or_W3, C, result_container)
             if result_container['success']:
                 _send_payload(client, webserver, result_container['payload'],
                               result_container['h_final'], result_container['w_final'], frame_num)
-                op('frame').text = frame_num
-                # Note: 'busy' remains True here as the browser will clear it upon receiving predictions
+                # Mark busy only once the send is queued; the browser clears it upon receiving predictions
+                webserver.store('busy', now)
+                frame_op.text = frame_num
             else:
                 debug("Synchronous repack failed:", result_container['error'])
-                webserver.store('busy', False)
         except Exception as e:
             debug("Synchronous repack exception:", e)
             webserver.store('busy', False)
+        finally:
+            _in_flight = False
         return
 
     # Main thread callbacks
-    frame_op = op('frame')
     def on_success(*args, **kwargs):
+        global _in_flight
+        # A newer frame took over after this one timed out; it owns the buffer now
+        if _in_flight_ts != now:
+            return
         try:
             sent = False
             if result_container['success']:
@@ -228,10 +383,16 @@ def send_frame_u8_chw():
         except Exception as ex:
             debug("Error in Threaded SuccessHook:", ex)
             webserver.store('busy', False)
+        finally:
+            _in_flight = False
 
     def on_except(*args, **kwargs):
+        global _in_flight
+        if _in_flight_ts != now:
+            return
         debug("Exception occurred during threaded texture repack task.")
         webserver.store('busy', False)
+        _in_flight = False
 
     # Create the task
     task = TDTask(
@@ -241,12 +402,18 @@ def send_frame_u8_chw():
         ExceptHook=on_except
     )
 
+    # Mark busy before enqueueing to lock the pipeline during packing/inference
+    webserver.store('busy', now)
+    _in_flight = True
+    _in_flight_ts = now
+
     # Enqueue task to the Thread Manager
     try:
         op.TDResources.ThreadManager.EnqueueTask(task)
     except Exception as e:
         debug("Failed to enqueue task to ThreadManager:", e)
         webserver.store('busy', False)
+        _in_flight = False
 
 # Example hook — trigger on a CHOP pulse/toggle or every frame:
 def onValueChange(channel, sampleIndex, val, prev):
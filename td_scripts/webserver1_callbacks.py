@@ -5,10 +5,27 @@
 import mimetypes
 import os
 import datetime
+import json
 import struct
 import numpy as np
 
 clients = {}
+# Snapshot of connected client ids, rebuilt only on open/close
+_client_list = []
+
+# Files whose MIME type must be exact for onnxruntime-web (some CDNs expect it)
+SPECIAL_MIME = {
+	"ort-wasm-simd-threaded.jsep.mjs": "application/javascript",
+	"ort-wasm-simd-threaded.jsep.wasm": "application/wasm",
+}
+
+# Inbound segmentation frame header: uint32 width, uint32 height (little-endian)
+_IN_HDR = struct.Struct('<II')
+
+# Messages forwarded between clients, queued per recipient as (text, is_json)
+# and flushed together
+_pending_forwards = {}
+_flush_run = None
 
 def onHTTPRequest(webServerDAT, request, response):
 	uri = request['uri']
@@ -33,36 +50,14 @@ def onHTTPRequest(webServerDAT, request, response):
 		fileContent = vfsFile.byteArray
 		fileName = vfsFile.name
 
-		special_filenames = [
-			"ort-wasm-simd-threaded.jsep.mjs",
-			"ort-wasm-simd-threaded.jsep.wasm"
-		]
-		for fname in special_filenames:
-			if uri.endswith(fname):
-				fileContent = vfsFile.byteArray
-				mimeType = mimetypes.guess_type(fname, strict=False)[0]
-				# Some CDNs expect the correct MIME types
-				if fname.endswith(".wasm"):
-					mimeType = "application/wasm"
-				if fname.endswith(".mjs"):
-					mimeType = "application/javascript"
-				if not mimeType:
-					mimeType = "application/octet-stream"
-				response['Content-Type'] = mimeType
-				response['statusCode'] = 200
-				response['statusReason'] = 'OK'
-				response['data'] = fileContent
-				response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-				response['Pragma'] = 'no-cache'
-				response['Expires'] = '0'    
-				return response
-
-		# Guess mime type
-		mimeType = mimetypes.guess_type(fileName, strict=False)[0]
-		if fileName.endswith('.bin'):
-			mimeType = 'application/octet-stream'
+		mimeType = SPECIAL_MIME.get(vfsFilename)
 		if not mimeType:
-			mimeType = 'application/octet-stream'  # fallback
+			# Guess mime type
+			mimeType = mimetypes.guess_type(fileName, strict=False)[0]
+			if fileName.endswith('.bin'):
+				mimeType = 'application/octet-stream'
+			if not mimeType:
+				mimeType = 'application/octet-stream'  # fallback
 
 		response['Content-Type'] = mimeType
 		response['statusCode'] = 200
@@ -95,6 +90,7 @@ def onWebSocketOpen(webServerDAT, client, uri):
 	
 	# Start keepalive timer
 	clients[client] = run(ping_loop, webServerDAT, client, delayMilliSeconds=30000)
+	_client_list[:] = clients.keys()
 	return
 
 def onWebSocketClose(webServerDAT, client):
@@ -104,6 +100,8 @@ def onWebSocketClose(webServerDAT, client):
 		except: pass
 		
 		del clients[client]
+		_client_list[:] = clients.keys()
+		_pending_forwards.pop(client, None)
 		op('webserver1').addWarning(f"[{datetime.datetime.now().isoformat()}] Client disconnected: {client}")
 		print(f"[{datetime.datetime.now().isoformat()}] Client disconnected: {client}")
 		op('active_client').text = ''
@@ -114,21 +112,69 @@ webcam_list = op('webcam_list')
 tick = op('tick')
 status = op('status')
 
+# Browser text messages start with a 1-byte type tag (see src/utils/protocol.js)
+# followed by the JSON payload, so dispatch is a single character compare.
+# Untagged messages from older web builds still go through the substring
+# checks below while this is enabled; drop it after one release.
+ACCEPT_UNTAGGED_TEXT = True
+
 def onWebSocketReceiveText(webServerDAT, client, data):
+	global _flush_run
 	# Flow Control: acknowledge receipt, unblocking the sender
 	
 	webServerDAT.store('busy', False)
-	
-	if '"type":"keepalive"' in data or '"type": "keepalive"' in data:
+
+	# If we receive results data, dump it directly into the relevant DAT
+	# Doing this here as TD 2022.33910 is much faster processing this at the WS server than WS client
+	# Tagged payloads are always a JSON object, so "X{" marks a tag; any other
+	# text (e.g. plain text from another client) falls through untouched
+	tag = data[:1] if data[1:2] == '{' else ''
+	if tag == 'P':
+		predictions.text = data[1:]
+		return
+	if tag == 'S' or tag == 'T':
+		tick.text = data[1:]
+		return
+	if tag == 'K':
+		return
+	if tag == 'W':
+		webcam_list.text = data[1:]
+		return
+	if tag == 'L':
+		parent().par.Loading = 0
 		return
+	if tag == 'F':
+		status.text = data[1:]
+		return
+
+	if ACCEPT_UNTAGGED_TEXT and _dispatch_untagged(data):
+		return
+
+	print('received WS from client: ' +client)
+	# Forwarded text is arbitrary, so only valid JSON may be coalesced
+	try:
+		json.loads(data, parse_constant=_reject_json_constant)
+		entry = (data, True)
+	except ValueError:
+		entry = (data, False)
+	for key in _client_list:
+		if key != client:
+			# print('forwaring WS message to client: ' +key)
+			_pending_forwards.setdefault(key, []).append(entry)
+	if _pending_forwards and _flush_run is None:
+		_flush_run = run(_flush_forwards, webServerDAT, delayMilliSeconds=5)
+	return
+
+def _dispatch_untagged(data):
+	# Legacy substring dispatch for untagged JSON; returns False to forward
+	if '"type":"keepalive"' in data or '"type": "keepalive"' in data:
+		return True
 
 	if '"type":"sync"' in data or '"type": "sync"' in data:
 		if 'tick' in data:
 			tick.text = data
-		return
+		return True
 
-	# If we receive results data, dump it directly into the relevant DAT
-	# Doing this here as TD 2022.33910 is much faster processing this at the WS server than WS client
 	if('type' in data):
 		predictions.text = data
 	elif('webcamDevices' in data):
@@ -141,29 +187,52 @@ def onWebSocketReceiveText(webServerDAT, client, data):
 		parent().par.Loading = 0
 	elif('lastFrameTime' in data):
 		status.text = data
+	else:
+		return False
+	return True
 
-	else:	
-		print('received WS from client: ' +client)
-		for key in clients.keys():
-			if key != client:
-				# print('forwaring WS message to client: ' +key)
-				webServerDAT.webSocketSendText(key, data)
+def _reject_json_constant(name):
+	# NaN/Infinity parse in Python but are not JSON, and would break the batch
+	raise ValueError(name)
+
+def _flush_forwards(webServerDAT):
+	# Runs of JSON messages go out as one {"batch":[...]} frame, even a lone
+	# message, so recipients always unpack the same shape. Non-JSON text is
+	# sent verbatim between batches, keeping the original order.
+	global _flush_run
+	_flush_run = None
+	pending = list(_pending_forwards.items())
+	_pending_forwards.clear()
+	for key, msgs in pending:
+		if key not in clients:
+			continue
+		batch = []
+		for text, is_json in msgs:
+			if is_json:
+				batch.append(text)
+				continue
+			if batch:
+				webServerDAT.webSocketSendText(key, '{"batch":[' + ','.join(batch) + ']}')
+				batch = []
+			webServerDAT.webSocketSendText(key, text)
+		if batch:
+			webServerDAT.webSocketSendText(key, '{"batch":[' + ','.join(batch) + ']}')
 	return
 
 segmentation_data = op('../segmentation_data')
 def onWebSocketReceiveBinary(webServerDAT, client, data):
-    width = int.from_bytes(data[0:4], byteorder='little')
-    height = int.from_bytes(data[4:8], byteorder='little')
-    payload = data[8:]
+    mv = memoryview(data)
+    if len(mv) < 8:
+        return
+    width, height = _IN_HDR.unpack_from(mv, 0)
 
-    # Must be a multiple of 4 bytes for float32
-    if len(payload) % 4 != 0:
+    # Payload must hold width*height float32 values
+    count = width * height
+    if len(mv) - 8 < count * 4:
         return
 
-    flat_array = np.frombuffer(payload, dtype=np.float32)
-    
-    # Reshape to image (Height, Width, 1 channel)
-    arr = flat_array.reshape((height, width, 1))
+    # Read the float32 payload in place (no data[8:] copy) as (Height, Width, 1 channel)
+    arr = np.frombuffer(mv, dtype=np.float32, count=count, offset=8).reshape((height, width, 1))
     
     # Copy to Script TOP
     try: